@@ -1,9 +1,11 @@
-"""Generate benchmark chart images for README."""
-import matplotlib.pyplot as plt
-import matplotlib
-import os
+"""Generate benchmark chart images for README.
 
-matplotlib.use("Agg")
+Writes SVG directly by default (no plotting dependency). Pass --png to render the
+original matplotlib PNGs instead.
+"""
+import argparse
+import os
+from xml.sax.saxutils import escape
 
 # Benchmark data (sorted by inference time ascending)
 models = [
@@ -30,7 +32,147 @@ ENGINE_COLORS = {
 }
 
 
+# ---------------------------------------------------------------------------
+# SVG output
+# ---------------------------------------------------------------------------
+
+SVG_WIDTH = 1000
+SVG_LEFT = 170      # room for model names
+SVG_RIGHT = 40
+SVG_TOP = 50        # room for title
+SVG_BOTTOM = 60     # room for tick labels + axis label
+SVG_ROW = 34
+SVG_BAR = 22        # 0.65 of a row, as in the PNG charts
+
+
+def _nice_step(span, target_ticks=6):
+    raw = span / target_ticks
+    magnitude = 10 ** (len(str(int(raw))) - 1) if raw >= 1 else 1
+    for m in (1, 2, 2.5, 5, 10):
+        if raw <= m * magnitude:
+            return m * magnitude
+    return 10 * magnitude
+
+
+def render_bar_chart_svg(title, xlabel, rows, x_max, value_fmt, vline=None, legend_top=False):
+    """Render a horizontal bar chart as an SVG string.
+
+    rows: list of (name, engine, value), drawn top to bottom.
+    vline: optional (x, color, label) marker line, labelled near the top of the plot.
+    legend_top: put the legend in the upper instead of the lower right corner
+    (whichever end has the short bars).
+    """
+    plot_w = SVG_WIDTH - SVG_LEFT - SVG_RIGHT
+    plot_h = SVG_ROW * len(rows)
+    height = SVG_TOP + plot_h + SVG_BOTTOM
+
+    def x_of(v):
+        return SVG_LEFT + plot_w * v / x_max
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" '
+        f'viewBox="0 0 {SVG_WIDTH} {height}" font-family="DejaVu Sans, Arial, sans-serif">',
+        f'<rect width="{SVG_WIDTH}" height="{height}" fill="#fff"/>',
+        f'<text x="{SVG_LEFT + plot_w / 2}" y="28" text-anchor="middle" font-size="16" '
+        f'font-weight="bold">{escape(title)}</text>',
+    ]
+
+    # X axis ticks + light grid
+    step = _nice_step(x_max)
+    tick = 0
+    axis_y = SVG_TOP + plot_h
+    while tick <= x_max:
+        x = x_of(tick)
+        out.append(f'<line x1="{x:.1f}" y1="{SVG_TOP}" x2="{x:.1f}" y2="{axis_y}" stroke="#eee"/>')
+        label = f"{tick:,.0f}" if step >= 1 else f"{tick:g}"
+        out.append(f'<text x="{x:.1f}" y="{axis_y + 18}" text-anchor="middle" font-size="11" '
+                   f'fill="#444">{label}</text>')
+        tick += step
+    out.append(f'<line x1="{SVG_LEFT}" y1="{axis_y}" x2="{SVG_LEFT + plot_w}" y2="{axis_y}" stroke="#222"/>')
+    out.append(f'<line x1="{SVG_LEFT}" y1="{SVG_TOP}" x2="{SVG_LEFT}" y2="{axis_y}" stroke="#222"/>')
+    out.append(f'<text x="{SVG_LEFT + plot_w / 2}" y="{height - 14}" text-anchor="middle" '
+               f'font-size="14">{escape(xlabel)}</text>')
+
+    # Bars
+    for i, (name, engine, value) in enumerate(rows):
+        y = SVG_TOP + i * SVG_ROW + (SVG_ROW - SVG_BAR) / 2
+        cy = y + SVG_BAR / 2
+        highlight = name in HIGHLIGHT
+        stroke = ' stroke="#222" stroke-width="2"' if highlight else ""
+        w = x_of(value) - SVG_LEFT
+        out.append(f'<rect x="{SVG_LEFT}" y="{y:.1f}" width="{w:.1f}" height="{SVG_BAR}" '
+                   f'fill="{ENGINE_COLORS.get(engine, "#888")}"{stroke}/>')
+        out.append(f'<text x="{SVG_LEFT - 8}" y="{cy:.1f}" text-anchor="end" dominant-baseline="middle" '
+                   f'font-size="13" font-family="DejaVu Sans Mono, Consolas, monospace">{escape(name)}</text>')
+        label = value_fmt(value) + ("  \u2605" if highlight else "")
+        weight = ' font-weight="bold"' if highlight else ""
+        out.append(f'<text x="{SVG_LEFT + w + 6:.1f}" y="{cy:.1f}" dominant-baseline="middle" '
+                   f'font-size="12"{weight}>{escape(label)}</text>')
+
+    if vline is not None:
+        vx, color, vlabel = vline
+        x = x_of(vx)
+        out.append(f'<line x1="{x:.1f}" y1="{SVG_TOP}" x2="{x:.1f}" y2="{axis_y}" stroke="{color}" '
+                   f'stroke-width="1" stroke-dasharray="6,4" opacity="0.7"/>')
+        for j, line in enumerate(vlabel.split("\n")):
+            out.append(f'<text x="{x + 6:.1f}" y="{SVG_TOP + 14 + j * 13}" font-size="11" '
+                       f'fill="{color}">{escape(line)}</text>')
+
+    # Legend (inside the plot, right side)
+    lx = SVG_LEFT + plot_w - 130
+    ly = SVG_TOP + 14 if legend_top else axis_y - 12 - 20 * len(ENGINE_COLORS)
+    out.append(f'<rect x="{lx - 8}" y="{ly - 8}" width="130" height="{20 * len(ENGINE_COLORS) + 6}" '
+               f'fill="#fff" stroke="#ccc" rx="3"/>')
+    for j, (engine, color) in enumerate(ENGINE_COLORS.items()):
+        y = ly + j * 20
+        out.append(f'<rect x="{lx}" y="{y}" width="18" height="11" fill="{color}"/>')
+        out.append(f'<text x="{lx + 26}" y="{y + 10}" font-size="12">{escape(engine)}</text>')
+
+    out.append("</svg>")
+    return "\n".join(out) + "\n"
+
+
+def make_inference_chart_svg():
+    rows = [(m[0], m[1], m[2]) for m in models]
+    svg = render_bar_chart_svg(
+        "Inference Speed: 11s JFK Audio (i5-1035G1, CPU-only)",
+        "Inference Time (ms) \u2014 lower is better",
+        rows,
+        x_max=max(r[2] for r in rows) * 1.25,
+        value_fmt=lambda t: f"{t:,} ms",
+        vline=(11000, "#CC3333", "real-time\n(11s audio)"),
+        legend_top=True,
+    )
+    with open(os.path.join(OUT_DIR, "benchmark-inference.svg"), "w", encoding="utf-8") as f:
+        f.write(svg)
+    print("Created benchmark-inference.svg")
+
+
+def make_throughput_chart_svg():
+    # Filter out models with 0 words/s, sort by throughput descending
+    rows = [(m[0], m[1], m[3]) for m in models if m[3] > 0]
+    rows.sort(key=lambda x: x[2], reverse=True)
+    svg = render_bar_chart_svg(
+        "Throughput: 11s JFK Audio (i5-1035G1, CPU-only)",
+        "Words per Second \u2014 higher is better",
+        rows,
+        x_max=max(r[2] for r in rows) * 1.2,
+        value_fmt=lambda w: f"{w:.1f} w/s",
+    )
+    with open(os.path.join(OUT_DIR, "benchmark-throughput.svg"), "w", encoding="utf-8") as f:
+        f.write(svg)
+    print("Created benchmark-throughput.svg")
+
+
+# ---------------------------------------------------------------------------
+# PNG output (matplotlib, --png)
+# ---------------------------------------------------------------------------
+
 def make_inference_chart():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(10, 5.5))
 
     names = [m[0] for m in models]
@@ -76,6 +218,10 @@ def make_inference_chart():
 
 
 def make_throughput_chart():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     # Filter out models with 0 words/s
     data = [(m[0], m[1], m[3]) for m in models if m[3] > 0]
     # Sort by throughput descending
@@ -121,7 +267,15 @@ def make_throughput_chart():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--png", action="store_true", help="Render PNGs with matplotlib instead of SVG")
+    args = parser.parse_args()
+
     os.makedirs(OUT_DIR, exist_ok=True)
-    make_inference_chart()
-    make_throughput_chart()
+    if args.png:
+        make_inference_chart()
+        make_throughput_chart()
+    else:
+        make_inference_chart_svg()
+        make_throughput_chart_svg()
     print("Done.")
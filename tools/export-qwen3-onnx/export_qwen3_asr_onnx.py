@@ -6,39 +6,62 @@ Based on libs/qwen-asr/python_simple_implementation.py (the authoritative refere
 
 Exports:
   encoder.onnx - Audio Encoder + Multi-Modal Projector
-    Input:  mel (float32, [1, 128, T])
-    Output: audio_features (float32, [1, N, 1024])
+    Input:  mel (float32, [B, 128, T])
+    Output: audio_features (float32, [B, N, 1024])
 
   decoder.onnx - LLM Decoder with KV cache
-    Inputs:  inputs_embeds (float32, [1, S, 1024]),
-             position_ids (int64, [1, S]),
-             past_key_values_0_key..past_key_values_27_value (float32, [1, 8, L, 128])
-    Outputs: logits (float32, [1, S, 151936]),
+    Inputs:  inputs_embeds (float32, [B, S, 1024]),
+             position_ids (int64, [B, S]), values < max_position_embeddings,
+             past_key_values_0_key..past_key_values_27_value (float32, [B, 8, L, 128])
+    Outputs: logits (float32, [B, S, 151936]),
              present_key_values_0_key..present_key_values_27_value
 
+  decoder.int8.onnx - With --int8: same interface as decoder.onnx, MatMul weights
+    quantized to INT8 (dynamic, per-channel; lm_head kept in FP32)
+
+  encoder.fp16.onnx, decoder.fp16.onnx - With --fp16: FP16 weights, FP32 inputs/outputs
+
+  encoder.opt.onnx, decoder.opt.onnx - With --optimize: same interface, LayerNorm/RMSNorm
+    and GELU pre-fused into onnxruntime contrib ops
+
+  Models over the 2 GB protobuf limit (or all, with --external-data) keep their weights
+  in encoder.onnx_data / decoder.onnx_data next to the .onnx file.
+
 Also exports:
   embed_tokens.bin - Raw float32 embedding matrix (~590MB)
+  embed_tokens.int8.bin + embed_tokens.scales.bin - With --int8: same matrix as int8 [V, D]
+    with one fp16 scale per row (~150MB); row = int8 * scale. Layout in embed_tokens.meta.json
   vocab.json, merges.txt - Copied from source model
 
 Usage:
     pip install -r requirements.txt
     python export_qwen3_asr_onnx.py --model-dir /path/to/Qwen3-ASR-0.6B --output-dir ./output
     python export_qwen3_asr_onnx.py --model-id Qwen/Qwen3-ASR-0.6B --output-dir ./output
+    python export_qwen3_asr_onnx.py --model-id Qwen/Qwen3-ASR-0.6B --cache-dir /mnt/ssd/hf --output-dir ./output
+    python export_qwen3_asr_onnx.py --model-dir /path/to/Qwen3-ASR-0.6B --output-dir ./output --fp16 --int8
+    python export_qwen3_asr_onnx.py --model-dir /path/to/Qwen3-ASR-0.6B --output-dir ./output --jobs 3
 """
 
 import argparse
+import gc
+import importlib.util
 import json
 import math
+import multiprocessing
 import os
 import shutil
 import sys
 import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from safetensors import safe_open
+from safetensors.torch import load as load_safetensors
 
 # ============================================================================
 # Config + Weight loading (from python_simple_implementation.py)
@@ -70,37 +93,147 @@ def load_config(model_dir):
         "dec_intermediate": txc["intermediate_size"],
         "dec_rms_norm_eps": txc["rms_norm_eps"],
         "dec_rope_theta": txc["rope_theta"],
+        "dec_max_position": txc.get("max_position_embeddings", 32768),
         "dec_vocab_size": txc["vocab_size"],
     }
 
 
+class _InMemoryShard:
+    """safe_open-like access to a shard read into memory with one bulk read.
+
+    The read happens on the first get_tensor(), so shards holding none of the tensors
+    a caller asks for are never loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tensors = None
+        self._lock = threading.Lock()
+
+    def keys(self):
+        if self._tensors is not None:
+            return list(self._tensors.keys())
+        # Header only
+        with safe_open(self.path, framework="pt") as f:
+            return list(f.keys())
+
+    def get_tensor(self, name):
+        with self._lock:
+            if self._tensors is None:
+                with open(self.path, "rb") as f:
+                    self._tensors = load_safetensors(f.read())
+            # Hand each tensor out once so its memory goes with the consumer
+            return self._tensors.pop(name)
+
+
 class MultiSafetensors:
-    def __init__(self, model_dir):
+    """Tensor reader over a sharded or single-file safetensors checkpoint.
+
+    Shards are kept open as safe_open handles, which memory-map the file: only the
+    bytes of tensors actually requested are paged in. With mmap=False each shard is
+    instead read whole into memory the first time one of its tensors is requested. On
+    Windows this replaces many small page-fault reads with large sequential ones, at the
+    cost of holding the shard in RAM.
+    """
+
+    # Number of recently returned tensors kept around for repeated reads (tied weights).
+    RECENT_CACHE_SIZE = 64
+
+    def __init__(self, model_dir, mmap=True):
+        if mmap:
+            open_shard = lambda path: safe_open(path, framework="pt")
+        else:
+            open_shard = _InMemoryShard
         index_path = os.path.join(model_dir, "model.safetensors.index.json")
         single_path = os.path.join(model_dir, "model.safetensors")
         if os.path.exists(index_path):
             with open(index_path) as f:
                 index = json.load(f)
-            shard_files = set(index["weight_map"].values())
-            self.files = {}
-            for shard in shard_files:
-                path = os.path.join(model_dir, shard)
-                self.files[shard] = safe_open(path, framework="pt")
+            shard_files = sorted(set(index["weight_map"].values()))
+            # Opening a shard parses its header and maps the file; do them concurrently.
+            with ThreadPoolExecutor(max_workers=min(8, len(shard_files))) as pool:
+                handles = pool.map(lambda shard: open_shard(os.path.join(model_dir, shard)),
+                                   shard_files)
+                self.files = dict(zip(shard_files, handles))
             self.weight_map = index["weight_map"]
         else:
-            self.files = {"model.safetensors": safe_open(single_path, framework="pt")}
-            self.weight_map = None
+            self.files = {"model.safetensors": open_shard(single_path)}
+            self.weight_map = {}
+            for shard, handle in self.files.items():
+                for name in handle.keys():
+                    self.weight_map[name] = shard
+        # Tensors read ahead by prefetch(), handed out (and dropped) by get_tensor().
+        self._cache = {}
+        # Small LRU of tensors already handed out, so a weight read twice is only read
+        # from disk once. Call clear_cache() after loading so these references don't
+        # keep a second copy of the model alive during export.
+        self._recent = OrderedDict()
+
+    def prefetch(self, names):
+        """Read many tensors up front, grouped by shard and spread across threads.
+
+        safetensors releases the GIL while copying tensor data out of the mapped file,
+        so the reads overlap. Each task only touches a single shard to keep page-cache
+        access sequential within a file.
+        """
+        by_shard = {}
+        for name in names:
+            if name in self._cache or name in self._recent:
+                continue
+            by_shard.setdefault(self.weight_map[name], []).append(name)
+        if not by_shard:
+            return
+
+        n_workers = min(8, os.cpu_count() or 1)
+        tasks = []
+        for shard, shard_names in by_shard.items():
+            step = max(1, math.ceil(len(shard_names) / n_workers))
+            for i in range(0, len(shard_names), step):
+                tasks.append((shard, shard_names[i:i + step]))
+
+        def read(task):
+            shard, shard_names = task
+            handle = self.files[shard]
+            return {name: handle.get_tensor(name) for name in shard_names}
+
+        with ThreadPoolExecutor(max_workers=min(n_workers, len(tasks))) as pool:
+            for tensors in pool.map(read, tasks):
+                self._cache.update(tensors)
 
     def get_tensor(self, name):
-        if self.weight_map:
-            shard = self.weight_map[name]
-            return self.files[shard].get_tensor(name)
-        for sf in self.files.values():
-            try:
-                return sf.get_tensor(name)
-            except Exception:
-                continue
-        raise KeyError(f"Weight not found: {name}")
+        if name in self._recent:
+            self._recent.move_to_end(name)
+            return self._recent[name]
+        tensor = self._cache.pop(name, None)
+        if tensor is None:
+            shard = self.weight_map.get(name)
+            if shard is None:
+                raise KeyError(f"Weight not found: {name}")
+            tensor = self.files[shard].get_tensor(name)
+        self._recent[name] = tensor
+        if len(self._recent) > self.RECENT_CACHE_SIZE:
+            self._recent.popitem(last=False)
+        return tensor
+
+    def clear_cache(self):
+        """Drop all prefetched and recently read tensors."""
+        self._cache.clear()
+        self._recent.clear()
+
+    def evict(self, prefix=""):
+        """Forget every tensor whose name starts with prefix (all by default).
+
+        Cached copies are dropped, and shards with no remaining tensors are closed,
+        unmapping their files.
+        """
+        for name in [n for n in self.weight_map if n.startswith(prefix)]:
+            del self.weight_map[name]
+            self._cache.pop(name, None)
+            self._recent.pop(name, None)
+        live = set(self.weight_map.values())
+        for shard in [s for s in self.files if s not in live]:
+            del self.files[shard]
+        gc.collect()
 
 
 def get_weight(sf, name):
@@ -115,16 +248,27 @@ def get_weight(sf, name):
 # ============================================================================
 
 class SinusoidalPositionEmbedding(nn.Module):
-    def __init__(self, channels, max_timescale=10000):
+    def __init__(self, channels, max_len, max_timescale=10000):
         super().__init__()
         self.channels = channels
         log_ts = math.log(max_timescale) / (channels // 2 - 1)
-        inv_ts = torch.exp(-log_ts * torch.arange(channels // 2, dtype=torch.float32))
-        self.register_buffer("inv_timescales", inv_ts)
+        # Explicit device: the table must be real even when the module is built on meta.
+        inv_ts = torch.exp(-log_ts * torch.arange(channels // 2, dtype=torch.float64, device="cpu"))
+        # The table only depends on position, so bake it in: the exported graph is a
+        # Slice on a constant instead of Range/Mul/Sin/Cos on every call.
+        # Computed in float64 (init-time only), stored as float32.
+        scaled = torch.arange(max_len, dtype=torch.float64, device="cpu").unsqueeze(1) * inv_ts.unsqueeze(0)
+        pe_table = torch.cat([torch.sin(scaled), torch.cos(scaled)], dim=1)
+        self.register_buffer("pe_table", pe_table.float(), persistent=False)
+        self.register_buffer("inv_ts", inv_ts.float(), persistent=False)
 
     def forward(self, length):
-        scaled = torch.arange(length, dtype=torch.float32, device=self.inv_timescales.device).unsqueeze(1) * self.inv_timescales.unsqueeze(0)
-        return torch.cat([torch.sin(scaled), torch.cos(scaled)], dim=1)
+        # Rows past the table are computed directly; for inputs that fit the table the
+        # slice below is empty, so the Sin/Cos run on zero elements.
+        beyond = torch.arange(length, dtype=torch.float32)[self.pe_table.shape[0]:]
+        scaled = beyond.unsqueeze(1) * self.inv_ts.unsqueeze(0)
+        extra = torch.cat([torch.sin(scaled), torch.cos(scaled)], dim=1)
+        return torch.cat([self.pe_table[:length], extra], dim=0)
 
 
 class EncoderAttentionLayer(nn.Module):
@@ -133,9 +277,8 @@ class EncoderAttentionLayer(nn.Module):
         self.n_heads = n_heads
         self.head_dim = d_model // n_heads
         self.self_attn_layer_norm = nn.LayerNorm(d_model)
-        self.q_proj = nn.Linear(d_model, d_model)
-        self.k_proj = nn.Linear(d_model, d_model)
-        self.v_proj = nn.Linear(d_model, d_model)
+        # Q/K/V fused into one projection: one MatMul reading x_norm once
+        self.qkv_proj = nn.Linear(d_model, 3 * d_model)
         self.out_proj = nn.Linear(d_model, d_model)
         self.final_layer_norm = nn.LayerNorm(d_model)
         self.fc1 = nn.Linear(d_model, ffn_dim)
@@ -146,9 +289,13 @@ class EncoderAttentionLayer(nn.Module):
         residual = x
         x_norm = self.self_attn_layer_norm(x)
         B, S, D = x_norm.shape
-        q = self.q_proj(x_norm).view(B, S, self.n_heads, self.head_dim).transpose(1, 2)
-        k = self.k_proj(x_norm).view(B, S, self.n_heads, self.head_dim).transpose(1, 2)
-        v = self.v_proj(x_norm).view(B, S, self.n_heads, self.head_dim).transpose(1, 2)
+        qkv = self.qkv_proj(x_norm).view(B, S, 3, self.n_heads, self.head_dim)
+        q, k, v = qkv.unbind(2)
+        q = q.transpose(1, 2)
+        k = k.transpose(1, 2)
+        v = v.transpose(1, 2)
+        # Full (non-causal) self-attention, no mask. Written out like the decoder's so ORT
+        # fuses Q.K^T.scale into a single FusedMatMul.
         scale = 1.0 / math.sqrt(self.head_dim)
         attn_weights = torch.matmul(q, k.transpose(-2, -1)) * scale
         attn_weights = F.softmax(attn_weights, dim=-1)
@@ -189,7 +336,7 @@ class Qwen3ASREncoder(nn.Module):
         self.conv_out = nn.Linear(conv_out_dim, d_model, bias=False)
 
         # Position embedding
-        self.pos_emb = SinusoidalPositionEmbedding(d_model)
+        self.pos_emb = SinusoidalPositionEmbedding(d_model, cfg["enc_max_source_pos"])
 
         # Transformer layers
         self.layers = nn.ModuleList([
@@ -204,19 +351,19 @@ class Qwen3ASREncoder(nn.Module):
         self.proj2 = nn.Linear(d_model, cfg["dec_hidden_size"])
 
     def forward(self, mel):
-        """mel: [1, 128, T] -> audio_features: [1, N, dec_hidden_size]"""
+        """mel: [B, 128, T] -> audio_features: [B, N, dec_hidden_size]"""
         # Conv stem
-        x = mel.unsqueeze(1)  # [1, 1, 128, T]
+        x = mel.unsqueeze(1)  # [B, 1, 128, T]
         x = F.gelu(self.conv2d1(x))
         x = F.gelu(self.conv2d2(x))
         x = F.gelu(self.conv2d3(x))
 
-        # [1, C, F, T'] -> [1, T', C*F]
+        # [B, C, F, T'] -> [B, T', C*F]
         B, C, Fr, T = x.shape
         x = x.permute(0, 3, 1, 2).contiguous().view(B, T, C * Fr)
 
         # Linear to d_model
-        x = self.conv_out(x)  # [1, T', d_model]
+        x = self.conv_out(x)  # [B, T', d_model]
         seq_len = x.shape[1]
 
         # Add sinusoidal pos embeddings
@@ -232,7 +379,7 @@ class Qwen3ASREncoder(nn.Module):
         x = F.gelu(self.proj1(x))
         x = self.proj2(x)
 
-        return x  # [1, N, dec_hidden_size]
+        return x  # [B, N, dec_hidden_size]
 
 
 # ============================================================================
@@ -254,30 +401,40 @@ class RMSNorm(nn.Module):
 
 
 class RotaryEmbedding(nn.Module):
-    def __init__(self, head_dim, theta=1000000.0):
+    def __init__(self, head_dim, max_position_embeddings, theta=1000000.0):
         super().__init__()
-        inv_freq = 1.0 / (theta ** (torch.arange(0, head_dim, 2, dtype=torch.float32) / head_dim))
-        self.register_buffer("inv_freq", inv_freq)
+        # float64 keeps theta ** (i / head_dim) and the large-position angles exact;
+        # the tables are cast to float32 once built. Explicit device: the tables must be
+        # real even when the module is built on meta.
+        inv_freq = 1.0 / (theta ** (torch.arange(0, head_dim, 2, dtype=torch.float64, device="cpu") / head_dim))
         self.head_dim = head_dim
 
+        # Precompute cos/sin for every position so the exported graph is a Gather
+        # on position_ids instead of Cast/Mul/Concat/Cos/Sin on every decoder call.
+        # Both halves of head_dim share the same angles, so only head_dim/2 is stored.
+        t = torch.arange(max_position_embeddings, dtype=torch.float64, device="cpu")
+        freqs = torch.outer(t, inv_freq)  # [max_pos, head_dim/2]
+        self.register_buffer("cos_cached", freqs.cos().float(), persistent=False)
+        self.register_buffer("sin_cached", freqs.sin().float(), persistent=False)
+
     def forward(self, position_ids):
-        """position_ids: [1, S] -> cos [1, S, head_dim], sin [1, S, head_dim]"""
-        # [S] x [head_dim/2] -> [S, head_dim/2]
-        pos = position_ids.squeeze(0).float()
-        angles = pos.unsqueeze(-1) * self.inv_freq.unsqueeze(0)
-        emb = torch.cat([angles, angles], dim=-1)  # [S, head_dim]
-        return emb.cos().unsqueeze(0), emb.sin().unsqueeze(0)
+        """position_ids: [B, S] -> cos [B, S, head_dim/2], sin [B, S, head_dim/2]"""
+        return self.cos_cached[position_ids], self.sin_cached[position_ids]
 
 
 def apply_rotary_pos_emb(x, cos, sin):
-    """x: [B, n_heads, S, head_dim], cos/sin: [1, S, head_dim]"""
-    cos = cos.unsqueeze(1)  # [1, 1, S, head_dim]
-    sin = sin.unsqueeze(1)
-    half = x.shape[-1] // 2
-    x1 = x[..., :half]
-    x2 = x[..., half:]
-    rotated = torch.cat([-x2, x1], dim=-1)
-    return x * cos + rotated * sin
+    """x: [B, n_heads, S, head_dim], cos/sin: [B, S, head_dim/2]
+
+    Rotates (x1, x2) = (first half, second half) of head_dim as a complex multiply,
+    equivalent to x * cos + rotate_half(x) * sin without the Neg/Concat.
+    """
+    d = x.shape[-1]
+    x1, x2 = x.view(*x.shape[:-1], 2, d // 2).unbind(-2)
+    c = cos.unsqueeze(1)  # [B, 1, S, head_dim/2]
+    s = sin.unsqueeze(1)
+    out1 = x1 * c - x2 * s
+    out2 = x1 * s + x2 * c
+    return torch.stack([out1, out2], dim=-2).view_as(x)
 
 
 class DecoderLayer(nn.Module):
@@ -297,15 +454,16 @@ class DecoderLayer(nn.Module):
         self.k_norm = RMSNorm(head_dim, eps)
 
         self.post_attention_layernorm = RMSNorm(hidden_size, eps)
-        self.gate_proj = nn.Linear(hidden_size, intermediate_size, bias=False)
-        self.up_proj = nn.Linear(hidden_size, intermediate_size, bias=False)
+        # gate_proj and up_proj fused: one MatMul, output split into [gate, up]
+        self.gate_up_proj = nn.Linear(hidden_size, 2 * intermediate_size, bias=False)
         self.down_proj = nn.Linear(intermediate_size, hidden_size, bias=False)
 
-    def forward(self, h, cos, sin, past_key, past_value):
+    def forward(self, h, cos, sin, past_key, past_value, causal_mask):
         """
-        h: [1, S, hidden_size]
-        cos, sin: [1, S, head_dim]
-        past_key, past_value: [1, n_kv_heads, L, head_dim]
+        h: [B, S, hidden_size]
+        cos, sin: [B, S, head_dim/2]
+        past_key, past_value: [B, n_kv_heads, L, head_dim]
+        causal_mask: [S, L + S] additive mask
         Returns: h, present_key, present_value
         """
         B, S, D = h.shape
@@ -316,7 +474,9 @@ class DecoderLayer(nn.Module):
         k = self.k_proj(x).view(B, S, self.n_kv_heads, self.head_dim)
         v = self.v_proj(x).view(B, S, self.n_kv_heads, self.head_dim)
 
-        # Per-head Q/K norms
+        # Per-head Q/K norms. The norm weights cannot be folded into q_proj/k_proj: the RMS
+        # is taken over the projected head, so pre-scaling the projection changes it. ORT
+        # fuses each RMSNorm into a single SimplifiedLayerNormalization node anyway.
         q = self.q_norm(q)
         k = self.k_norm(k)
 
@@ -336,25 +496,20 @@ class DecoderLayer(nn.Module):
         present_key = k
         present_value = v
 
-        # GQA expansion
+        # GQA expansion: broadcast each KV head to its query heads (Expand+Reshape,
+        # same head order as repeat_interleave but without a Tile/gather in the graph)
         if self.gqa_ratio > 1:
-            k = k.repeat_interleave(self.gqa_ratio, dim=1)
-            v = v.repeat_interleave(self.gqa_ratio, dim=1)
-
-        # Scaled dot-product attention (causal)
+            B_, H, L, Dh = k.shape
+            k = k.unsqueeze(2).expand(B_, H, self.gqa_ratio, L, Dh).reshape(B_, H * self.gqa_ratio, L, Dh)
+            v = v.unsqueeze(2).expand(B_, H, self.gqa_ratio, L, Dh).reshape(B_, H * self.gqa_ratio, L, Dh)
+
+        # Scaled dot-product attention (causal). Written out rather than via
+        # F.scaled_dot_product_attention: the TorchScript exporter lowers that to a
+        # split sqrt(scale) on Q and on the transposed, expanded K, which ORT cannot
+        # fold into a FusedMatMul and which costs two extra passes over the KV cache.
         scale = 1.0 / math.sqrt(self.head_dim)
         attn_weights = torch.matmul(q, k.transpose(-2, -1)) * scale
-
-        # Causal mask
-        total_len = k.shape[2]
-        # Create causal mask: each query position can attend to itself and all previous KV positions
-        causal_mask = torch.triu(
-            torch.full((S, total_len), float("-inf"), device=h.device, dtype=h.dtype),
-            diagonal=total_len - S + 1
-        )
-        attn_weights = attn_weights + causal_mask.unsqueeze(0).unsqueeze(0)
-        attn_weights = F.softmax(attn_weights, dim=-1)
-
+        attn_weights = F.softmax(attn_weights + causal_mask, dim=-1)
         attn_out = torch.matmul(attn_weights, v)
         attn_out = attn_out.transpose(1, 2).contiguous().view(B, S, self.n_heads * self.head_dim)
 
@@ -363,9 +518,8 @@ class DecoderLayer(nn.Module):
         # FFN
         residual = h
         x = self.post_attention_layernorm(h)
-        gate = F.silu(self.gate_proj(x))
-        up = self.up_proj(x)
-        h = residual + self.down_proj(gate * up)
+        gate, up = self.gate_up_proj(x).chunk(2, dim=-1)
+        h = residual + self.down_proj(F.silu(gate) * up)
 
         return h, present_key, present_value
 
@@ -386,7 +540,7 @@ class Qwen3ASRDecoder(nn.Module):
         self.n_kv_heads = n_kv_heads
         self.head_dim = head_dim
 
-        self.rotary_emb = RotaryEmbedding(head_dim, cfg["dec_rope_theta"])
+        self.rotary_emb = RotaryEmbedding(head_dim, cfg["dec_max_position"], cfg["dec_rope_theta"])
         self.layers = nn.ModuleList([
             DecoderLayer(hidden_size, n_heads, n_kv_heads, head_dim, intermediate, eps)
             for _ in range(n_layers)
@@ -396,19 +550,31 @@ class Qwen3ASRDecoder(nn.Module):
 
     def forward(self, inputs_embeds, position_ids, *past_kv_flat):
         """
-        inputs_embeds: [1, S, hidden_size]
-        position_ids: [1, S]
-        past_kv_flat: 28 * 2 tensors (key, value) each [1, n_kv_heads, L, head_dim]
-        Returns: logits [1, S, vocab_size], 28 * 2 present KV tensors
+        inputs_embeds: [B, S, hidden_size]
+        position_ids: [B, S]
+        past_kv_flat: 28 * 2 tensors (key, value) each [B, n_kv_heads, L, head_dim]
+        Returns: logits [B, S, vocab_size], 28 * 2 present KV tensors
+
+        All sequences in a batch share S and L (no padding mask).
         """
         cos, sin = self.rotary_emb(position_ids)
 
+        # Causal mask, shared by all layers: each query position can attend to itself and all
+        # previous KV positions. Always passed explicitly: is_causal would be fixed at trace time
+        # (prefill, S == total_len) and is top-left aligned, which is wrong once a KV cache is present.
+        S = inputs_embeds.shape[1]
+        total_len = past_kv_flat[0].shape[2] + S
+        causal_mask = torch.triu(
+            torch.full((S, total_len), float("-inf"), device=inputs_embeds.device, dtype=inputs_embeds.dtype),
+            diagonal=total_len - S + 1
+        )
+
         h = inputs_embeds
         present_kvs = []
         for i, layer in enumerate(self.layers):
             past_key = past_kv_flat[i * 2]
             past_value = past_kv_flat[i * 2 + 1]
-            h, present_key, present_value = layer(h, cos, sin, past_key, past_value)
+            h, present_key, present_value = layer(h, cos, sin, past_key, past_value, causal_mask)
             present_kvs.append(present_key)
             present_kvs.append(present_value)
 
@@ -422,49 +588,71 @@ class Qwen3ASRDecoder(nn.Module):
 # Weight loading into modules
 # ============================================================================
 
+def load_weights(module, sf, weights):
+    """Load a {parameter name: checkpoint name} mapping into module in one call.
+
+    A checkpoint name may be a list for fused parameters; those tensors are
+    concatenated along dim 0 (output features) in order. All reads are prefetched
+    up front, then load_state_dict(assign=True) rebinds the parameters to the loaded
+    tensors instead of copying into existing ones. Build module under
+    torch.device("meta") so no parameter storage exists before this call.
+    """
+    sf.prefetch([n for name in weights.values() for n in ([name] if isinstance(name, str) else name)])
+    state_dict = {}
+    for key, name in weights.items():
+        if isinstance(name, str):
+            state_dict[key] = get_weight(sf, name)
+        else:
+            state_dict[key] = torch.cat([get_weight(sf, n) for n in name], dim=0)
+    module.load_state_dict(state_dict, strict=True, assign=True)
+    sf.clear_cache()
+
+
 def load_encoder_weights(encoder, sf, cfg):
     """Load weights from safetensors into the encoder module."""
     prefix = "thinker.audio_tower"
 
     # Conv stem
-    encoder.conv2d1.weight.data = get_weight(sf, f"{prefix}.conv2d1.weight")
-    encoder.conv2d1.bias.data = get_weight(sf, f"{prefix}.conv2d1.bias")
-    encoder.conv2d2.weight.data = get_weight(sf, f"{prefix}.conv2d2.weight")
-    encoder.conv2d2.bias.data = get_weight(sf, f"{prefix}.conv2d2.bias")
-    encoder.conv2d3.weight.data = get_weight(sf, f"{prefix}.conv2d3.weight")
-    encoder.conv2d3.bias.data = get_weight(sf, f"{prefix}.conv2d3.bias")
-    encoder.conv_out.weight.data = get_weight(sf, f"{prefix}.conv_out.weight")
+    weights = {
+        "conv2d1.weight": f"{prefix}.conv2d1.weight",
+        "conv2d1.bias": f"{prefix}.conv2d1.bias",
+        "conv2d2.weight": f"{prefix}.conv2d2.weight",
+        "conv2d2.bias": f"{prefix}.conv2d2.bias",
+        "conv2d3.weight": f"{prefix}.conv2d3.weight",
+        "conv2d3.bias": f"{prefix}.conv2d3.bias",
+        "conv_out.weight": f"{prefix}.conv_out.weight",
+    }
 
     # Transformer layers
     for i in range(cfg["enc_layers"]):
         lp = f"{prefix}.layers.{i}"
-        layer = encoder.layers[i]
-        layer.self_attn_layer_norm.weight.data = get_weight(sf, f"{lp}.self_attn_layer_norm.weight")
-        layer.self_attn_layer_norm.bias.data = get_weight(sf, f"{lp}.self_attn_layer_norm.bias")
-        layer.q_proj.weight.data = get_weight(sf, f"{lp}.self_attn.q_proj.weight")
-        layer.q_proj.bias.data = get_weight(sf, f"{lp}.self_attn.q_proj.bias")
-        layer.k_proj.weight.data = get_weight(sf, f"{lp}.self_attn.k_proj.weight")
-        layer.k_proj.bias.data = get_weight(sf, f"{lp}.self_attn.k_proj.bias")
-        layer.v_proj.weight.data = get_weight(sf, f"{lp}.self_attn.v_proj.weight")
-        layer.v_proj.bias.data = get_weight(sf, f"{lp}.self_attn.v_proj.bias")
-        layer.out_proj.weight.data = get_weight(sf, f"{lp}.self_attn.out_proj.weight")
-        layer.out_proj.bias.data = get_weight(sf, f"{lp}.self_attn.out_proj.bias")
-        layer.final_layer_norm.weight.data = get_weight(sf, f"{lp}.final_layer_norm.weight")
-        layer.final_layer_norm.bias.data = get_weight(sf, f"{lp}.final_layer_norm.bias")
-        layer.fc1.weight.data = get_weight(sf, f"{lp}.fc1.weight")
-        layer.fc1.bias.data = get_weight(sf, f"{lp}.fc1.bias")
-        layer.fc2.weight.data = get_weight(sf, f"{lp}.fc2.weight")
-        layer.fc2.bias.data = get_weight(sf, f"{lp}.fc2.bias")
-
-    # Final LN
-    encoder.ln_post.weight.data = get_weight(sf, f"{prefix}.ln_post.weight")
-    encoder.ln_post.bias.data = get_weight(sf, f"{prefix}.ln_post.bias")
-
-    # Projector
-    encoder.proj1.weight.data = get_weight(sf, f"{prefix}.proj1.weight")
-    encoder.proj1.bias.data = get_weight(sf, f"{prefix}.proj1.bias")
-    encoder.proj2.weight.data = get_weight(sf, f"{prefix}.proj2.weight")
-    encoder.proj2.bias.data = get_weight(sf, f"{prefix}.proj2.bias")
+        mp = f"layers.{i}"
+        weights.update({
+            f"{mp}.self_attn_layer_norm.weight": f"{lp}.self_attn_layer_norm.weight",
+            f"{mp}.self_attn_layer_norm.bias": f"{lp}.self_attn_layer_norm.bias",
+            f"{mp}.qkv_proj.weight": [f"{lp}.self_attn.{proj}_proj.weight" for proj in "qkv"],
+            f"{mp}.qkv_proj.bias": [f"{lp}.self_attn.{proj}_proj.bias" for proj in "qkv"],
+            f"{mp}.out_proj.weight": f"{lp}.self_attn.out_proj.weight",
+            f"{mp}.out_proj.bias": f"{lp}.self_attn.out_proj.bias",
+            f"{mp}.final_layer_norm.weight": f"{lp}.final_layer_norm.weight",
+            f"{mp}.final_layer_norm.bias": f"{lp}.final_layer_norm.bias",
+            f"{mp}.fc1.weight": f"{lp}.fc1.weight",
+            f"{mp}.fc1.bias": f"{lp}.fc1.bias",
+            f"{mp}.fc2.weight": f"{lp}.fc2.weight",
+            f"{mp}.fc2.bias": f"{lp}.fc2.bias",
+        })
+
+    # Final LN + projector
+    weights.update({
+        "ln_post.weight": f"{prefix}.ln_post.weight",
+        "ln_post.bias": f"{prefix}.ln_post.bias",
+        "proj1.weight": f"{prefix}.proj1.weight",
+        "proj1.bias": f"{prefix}.proj1.bias",
+        "proj2.weight": f"{prefix}.proj2.weight",
+        "proj2.bias": f"{prefix}.proj2.bias",
+    })
+
+    load_weights(encoder, sf, weights)
 
     print(f"Loaded encoder weights ({cfg['enc_layers']} layers)", file=sys.stderr)
 
@@ -473,25 +661,29 @@ def load_decoder_weights(decoder, sf, cfg):
     """Load weights from safetensors into the decoder module."""
     prefix = "thinker.model"
 
+    weights = {}
     for i in range(cfg["dec_layers"]):
         lp = f"{prefix}.layers.{i}"
-        layer = decoder.layers[i]
-        layer.input_layernorm.weight.data = get_weight(sf, f"{lp}.input_layernorm.weight")
-        layer.q_proj.weight.data = get_weight(sf, f"{lp}.self_attn.q_proj.weight")
-        layer.k_proj.weight.data = get_weight(sf, f"{lp}.self_attn.k_proj.weight")
-        layer.v_proj.weight.data = get_weight(sf, f"{lp}.self_attn.v_proj.weight")
-        layer.o_proj.weight.data = get_weight(sf, f"{lp}.self_attn.o_proj.weight")
-        layer.q_norm.weight.data = get_weight(sf, f"{lp}.self_attn.q_norm.weight")
-        layer.k_norm.weight.data = get_weight(sf, f"{lp}.self_attn.k_norm.weight")
-        layer.post_attention_layernorm.weight.data = get_weight(sf, f"{lp}.post_attention_layernorm.weight")
-        layer.gate_proj.weight.data = get_weight(sf, f"{lp}.mlp.gate_proj.weight")
-        layer.up_proj.weight.data = get_weight(sf, f"{lp}.mlp.up_proj.weight")
-        layer.down_proj.weight.data = get_weight(sf, f"{lp}.mlp.down_proj.weight")
-        if (i + 1) % 8 == 0:
-            print(f"  Decoder layer {i+1}/{cfg['dec_layers']} loaded", file=sys.stderr)
-
-    decoder.norm.weight.data = get_weight(sf, f"{prefix}.norm.weight")
-    decoder.lm_head.weight.data = get_weight(sf, "thinker.lm_head.weight")
+        mp = f"layers.{i}"
+        weights.update({
+            f"{mp}.input_layernorm.weight": f"{lp}.input_layernorm.weight",
+            f"{mp}.q_proj.weight": f"{lp}.self_attn.q_proj.weight",
+            f"{mp}.k_proj.weight": f"{lp}.self_attn.k_proj.weight",
+            f"{mp}.v_proj.weight": f"{lp}.self_attn.v_proj.weight",
+            f"{mp}.o_proj.weight": f"{lp}.self_attn.o_proj.weight",
+            f"{mp}.q_norm.weight": f"{lp}.self_attn.q_norm.weight",
+            f"{mp}.k_norm.weight": f"{lp}.self_attn.k_norm.weight",
+            f"{mp}.post_attention_layernorm.weight": f"{lp}.post_attention_layernorm.weight",
+            f"{mp}.gate_up_proj.weight": [f"{lp}.mlp.gate_proj.weight", f"{lp}.mlp.up_proj.weight"],
+            f"{mp}.down_proj.weight": f"{lp}.mlp.down_proj.weight",
+        })
+
+    weights.update({
+        "norm.weight": f"{prefix}.norm.weight",
+        "lm_head.weight": "thinker.lm_head.weight",
+    })
+
+    load_weights(decoder, sf, weights)
 
     print(f"Loaded decoder weights ({cfg['dec_layers']} layers)", file=sys.stderr)
 
@@ -500,72 +692,62 @@ def load_decoder_weights(decoder, sf, cfg):
 # Export functions
 # ============================================================================
 
-def export_encoder(encoder, cfg, output_dir):
-    """Export encoder to ONNX."""
+def export_encoder(encoder, cfg, output_dir, validate=True, external_data=False):
+    """Export encoder to ONNX.
+
+    Returns (output_path, reference), where reference is (ort_inputs, expected) for
+    validate_in_subprocess(), or None when validate is False.
+    """
     encoder.eval()
     output_path = os.path.join(output_dir, "encoder.onnx")
 
     # Dummy input: 1 batch, 128 mel bins, 200 frames (2 chunks of 100)
-    dummy_mel = torch.randn(1, 128, 200)
+    ort_inputs = dummy_inputs("encoder", cfg)
+    dummy_mel = torch.from_numpy(ort_inputs["mel"])
 
     print("Exporting encoder to ONNX...", file=sys.stderr)
     torch.onnx.export(
         encoder,
         (dummy_mel,),
         output_path,
-        opset_version=17,
+        opset_version=18,
         input_names=["mel"],
         output_names=["audio_features"],
         dynamic_axes={
-            "mel": {2: "num_frames"},
-            "audio_features": {1: "num_tokens"},
+            "mel": {0: "batch", 2: "num_frames"},
+            "audio_features": {0: "batch", 1: "num_tokens"},
         },
         do_constant_folding=True,
         dynamo=False,
     )
+    consolidate_external_data(output_path, force=external_data)
     print(f"Encoder exported to {output_path}", file=sys.stderr)
 
-    # Validate
-    import onnxruntime as ort
-    sess = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+    if not validate:
+        return output_path, None
+
+    # PyTorch reference output, computed while the module is still alive
     with torch.no_grad():
         pt_out = encoder(dummy_mel).numpy()
-    ort_out = sess.run(None, {"mel": dummy_mel.numpy()})[0]
-    diff = np.abs(pt_out - ort_out).max()
-    print(f"Encoder validation: max diff = {diff:.6e}", file=sys.stderr)
-    assert diff < 1e-4, f"Encoder validation failed: max diff {diff}"
+    return output_path, (ort_inputs, pt_out)
 
-    return output_path
 
+def export_decoder(decoder, cfg, output_dir, validate=True, external_data=False):
+    """Export decoder to ONNX with KV cache.
 
-def export_decoder(decoder, cfg, output_dir):
-    """Export decoder to ONNX with KV cache."""
+    Returns (output_path, reference) like export_encoder().
+    """
     decoder.eval()
     output_path = os.path.join(output_dir, "decoder.onnx")
 
     n_layers = cfg["dec_layers"]
-    n_kv_heads = cfg["dec_kv_heads"]
-    head_dim = cfg["dec_head_dim"]
-    hidden_size = cfg["dec_hidden_size"]
-
-    # Dummy inputs
-    seq_len = 5
-    past_len = 0
-    dummy_embeds = torch.randn(1, seq_len, hidden_size)
-    dummy_pos = torch.arange(past_len, past_len + seq_len, dtype=torch.long).unsqueeze(0)
-
-    # Past KV cache (empty for prefill)
-    past_kvs = []
-    for i in range(n_layers):
-        past_kvs.append(torch.zeros(1, n_kv_heads, past_len, head_dim))  # key
-        past_kvs.append(torch.zeros(1, n_kv_heads, past_len, head_dim))  # value
 
     input_names = ["inputs_embeds", "position_ids"]
     output_names = ["logits"]
     dynamic_axes = {
-        "inputs_embeds": {1: "seq_len"},
-        "position_ids": {1: "seq_len"},
-        "logits": {1: "seq_len"},
+        "inputs_embeds": {0: "batch", 1: "seq_len"},
+        "position_ids": {0: "batch", 1: "seq_len"},
+        "logits": {0: "batch", 1: "seq_len"},
     }
 
     for i in range(n_layers):
@@ -573,59 +755,436 @@ def export_decoder(decoder, cfg, output_dir):
         input_names.append(f"past_key_values.{i}.value")
         output_names.append(f"present_key_values.{i}.key")
         output_names.append(f"present_key_values.{i}.value")
-        dynamic_axes[f"past_key_values.{i}.key"] = {2: "past_len"}
-        dynamic_axes[f"past_key_values.{i}.value"] = {2: "past_len"}
-        dynamic_axes[f"present_key_values.{i}.key"] = {2: "total_len"}
-        dynamic_axes[f"present_key_values.{i}.value"] = {2: "total_len"}
+        dynamic_axes[f"past_key_values.{i}.key"] = {0: "batch", 2: "past_len"}
+        dynamic_axes[f"past_key_values.{i}.value"] = {0: "batch", 2: "past_len"}
+        dynamic_axes[f"present_key_values.{i}.key"] = {0: "batch", 2: "total_len"}
+        dynamic_axes[f"present_key_values.{i}.value"] = {0: "batch", 2: "total_len"}
 
-    args = (dummy_embeds, dummy_pos, *past_kvs)
+    # Dummy inputs: prefill with an empty KV cache. One tensor per input (torch.tensor
+    # copies): the cache arrays are shared, and the tracer tells inputs apart by tensor.
+    ort_inputs = decoder_dummy_inputs(cfg)
+    args = tuple(torch.tensor(ort_inputs[name]) for name in input_names)
 
     print("Exporting decoder to ONNX...", file=sys.stderr)
     torch.onnx.export(
         decoder,
         args,
         output_path,
-        opset_version=17,
+        opset_version=18,
         input_names=input_names,
         output_names=output_names,
         dynamic_axes=dynamic_axes,
         do_constant_folding=True,
         dynamo=False,
     )
+    consolidate_external_data(output_path, force=external_data)
     print(f"Decoder exported to {output_path}", file=sys.stderr)
 
-    # Validate
-    import onnxruntime as ort
-    sess = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+    if not validate:
+        return output_path, None
+
+    # PyTorch reference logits, computed while the module is still alive
     with torch.no_grad():
-        pt_outputs = decoder(*args)
-    pt_logits = pt_outputs[0].numpy()
+        pt_logits = decoder(*args)[0].numpy()
+    return output_path, (ort_inputs, pt_logits)
 
-    ort_inputs = {"inputs_embeds": dummy_embeds.numpy(), "position_ids": dummy_pos.numpy()}
-    for i in range(n_layers):
-        ort_inputs[f"past_key_values.{i}.key"] = past_kvs[i * 2].numpy()
-        ort_inputs[f"past_key_values.{i}.value"] = past_kvs[i * 2 + 1].numpy()
-    ort_outputs = sess.run(None, ort_inputs)
-    ort_logits = ort_outputs[0]
 
-    diff = np.abs(pt_logits - ort_logits).max()
-    print(f"Decoder validation: max diff = {diff:.6e}", file=sys.stderr)
-    assert diff < 1e-4, f"Decoder validation failed: max diff {diff}"
+def save_onnx(model, path, external_data=None):
+    """Save a ModelProto, with weights in <name>.onnx_data when external_data is set.
+
+    external_data=None picks external data only when the model would not fit in a
+    single protobuf (2 GB).
+    """
+    import onnx
+
+    if external_data is None:
+        external_data = model.ByteSize() >= onnx.checker.MAXIMUM_PROTOBUF
+    if not external_data:
+        onnx.save_model(model, path)
+        return
+    location = os.path.basename(path) + "_data"
+    # save_model appends to an existing data file, so a stale one from a previous
+    # export into the same directory must go first (weights are in memory by now)
+    data_path = os.path.join(os.path.dirname(path), location)
+    if os.path.exists(data_path):
+        os.remove(data_path)
+    onnx.save_model(model, path, save_as_external_data=True, all_tensors_to_one_file=True,
+                    location=location, size_threshold=1024, convert_attribute=False)
+
+
+def external_data_files(path):
+    """Names of the external data files an ONNX model's initializers refer to."""
+    import onnx
+    from onnx.external_data_helper import uses_external_data
+
+    header = onnx.load(path, load_external_data=False)
+    return {
+        entry.value
+        for tensor in header.graph.initializer if uses_external_data(tensor)
+        for entry in tensor.external_data if entry.key == "location"
+    }
+
+
+def consolidate_external_data(path, force=False):
+    """Store the weights of an exported model in a single <name>.onnx_data file.
+
+    torch.onnx.export falls back to one external file per tensor for models over the
+    2 GB protobuf limit. Those are gathered into one file holding every tensor of 1 KB
+    or more. With force=True, models that were saved inline are converted too.
+    """
+    import onnx
+
+    old_files = external_data_files(path)
+    if not old_files and not force:
+        return
+
+    location = os.path.basename(path) + "_data"
+    print(f"Writing {os.path.basename(path)} weights to {location}...", file=sys.stderr)
+    model = onnx.load(path)
+    save_onnx(model, path, external_data=True)
+    del model
+    output_dir = os.path.dirname(path)
+    for name in old_files - {location}:
+        os.remove(os.path.join(output_dir, name))
+
+
+def run_onnx(path, ort_inputs):
+    """First output of an ONNX model on CPU."""
+    import onnxruntime as ort
+    sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return sess.run(None, ort_inputs)[0]
+
+
+def validate_onnx(path, ort_inputs, expected, label, atol=1e-4):
+    """Check the first output of an ONNX model against expected (PyTorch or FP32 ONNX)."""
+    diff = np.abs(expected - run_onnx(path, ort_inputs)).max()
+    print(f"{label} validation: max diff = {diff:.6e}", file=sys.stderr)
+    assert diff < atol, f"{label} validation failed: max diff {diff}"
+
+
+def validate_in_subprocess(path, ort_inputs, expected, label):
+    """Check an exported model against PyTorch reference outputs in a child process.
+
+    Run after the PyTorch module has been freed, so the ORT session does not sit
+    alongside it in the exporter's address space.
+    """
+    proc = multiprocessing.Process(target=validate_onnx, args=(path, ort_inputs, expected, label))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        raise RuntimeError(f"{label} validation failed (exit code {proc.exitcode})")
+
+
+def quantize_decoder(decoder_path, cfg, validate=True):
+    """Quantize decoder MatMul weights to INT8 (dynamic, per-channel) as decoder.int8.onnx.
+
+    lm_head is left in FP32 for logit stability. The encoder is not quantized: its
+    conv stem is numerically sensitive and would need separate validation.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = decoder_path.replace(".onnx", ".int8.onnx")
+
+    print("Quantizing decoder to INT8...", file=sys.stderr)
+    quantize_dynamic(
+        decoder_path,
+        output_path,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        reduce_range=False,
+        op_types_to_quantize=["MatMul", "Gemm"],
+        nodes_to_exclude=["/lm_head/MatMul"],
+    )
+    print(f"INT8 decoder exported to {output_path}", file=sys.stderr)
+
+    if validate:
+        ort_inputs = decoder_dummy_inputs(cfg)
+        validate_onnx(output_path, ort_inputs, run_onnx(decoder_path, ort_inputs),
+                      "INT8 decoder", atol=5e-2)
+
+    return output_path
+
+
+def convert_to_fp16(model_path, cfg, validate=True):
+    """Convert an exported FP32 model to FP16 weights/compute as <name>.fp16.onnx.
+
+    Inputs and outputs stay FP32 (keep_io_types) so callers feed the same tensors.
+    Normalization statistics and softmax stay in FP32 to avoid FP16 overflow, and
+    lm_head stays FP32 for logit stability.
+    """
+    from onnxruntime.transformers import float16
+
+    output_path = model_path.replace(".onnx", ".fp16.onnx")
+
+    print(f"Converting {os.path.basename(model_path)} to FP16...", file=sys.stderr)
+    # Passed as a path: the converter then runs shape inference with infer_shapes_path,
+    # which handles models over 2 GB; given a ModelProto it serializes it in memory.
+    model_fp16 = float16.convert_float_to_float16(
+        model_path,
+        keep_io_types=True,
+        op_block_list=float16.DEFAULT_OP_BLOCK_LIST + [
+            "LayerNormalization", "Softmax", "Pow", "ReduceMean"],
+        node_block_list=["/lm_head/MatMul"],
+    )
+    save_onnx(model_fp16, output_path)
+    del model_fp16
+    print(f"FP16 model exported to {output_path}", file=sys.stderr)
+
+    if validate:
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        ort_inputs = dummy_inputs(name, cfg)
+        validate_onnx(output_path, ort_inputs, run_onnx(model_path, ort_inputs),
+                      f"FP16 {name}", atol=5e-2)
 
     return output_path
 
 
-def export_embeddings(sf, output_dir):
-    """Export embedding matrix as raw float32 binary."""
+def optimize_onnx(model_path, cfg, validate=True):
+    """Apply ORT's offline transformer fusions to an exported model as <name>.opt.onnx.
+
+    Fuses LayerNorm/RMSNorm (+ residual) and GELU into com.microsoft contrib ops and
+    folds shape arithmetic, so sessions start from an already-fused graph. opt_level=1
+    keeps the result provider-independent (usable with DirectML as well as CPU).
+    """
+    from onnxruntime.transformers.optimizer import optimize_model
+
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    output_path = model_path.replace(".onnx", ".opt.onnx")
+    if name == "encoder":
+        model_type, num_heads, hidden_size = "bert", cfg["enc_heads"], cfg["enc_d_model"]
+    else:
+        model_type, num_heads, hidden_size = "gpt2", cfg["dec_heads"], cfg["dec_hidden_size"]
+
+    print(f"Optimizing {os.path.basename(model_path)}...", file=sys.stderr)
+    model = optimize_model(model_path, model_type=model_type, num_heads=num_heads,
+                           hidden_size=hidden_size, opt_level=1)
+    fused = {op: n for op, n in model.get_fused_operator_statistics().items() if n}
+    print(f"Fused operators: {fused}", file=sys.stderr)
+    # The optimizer loads external weights inline; a model that came with them is written
+    # back the same way rather than as a single protobuf (limited to 2 GB)
+    save_onnx(model.model, output_path, external_data=bool(external_data_files(model_path)) or None)
+    del model
+    print(f"Optimized model exported to {output_path}", file=sys.stderr)
+
+    if validate:
+        ort_inputs = dummy_inputs(name, cfg)
+        validate_onnx(output_path, ort_inputs, run_onnx(model_path, ort_inputs),
+                      f"Optimized {name}")
+
+    return output_path
+
+
+def dummy_inputs(name, cfg):
+    """Random inputs (numpy) for exporting and validating encoder.onnx or decoder.onnx."""
+    if name == "encoder":
+        return {"mel": np.random.default_rng(0).standard_normal((1, 128, 200), dtype=np.float32)}
+    return decoder_dummy_inputs(cfg)
+
+
+def decoder_dummy_inputs(cfg, seq_len=5):
+    """Random prefill inputs (empty KV cache) for decoder.onnx, keyed by input name."""
+    rng = np.random.default_rng(0)
+    ort_inputs = {
+        "inputs_embeds": rng.standard_normal((1, seq_len, cfg["dec_hidden_size"]), dtype=np.float32),
+        "position_ids": np.arange(seq_len, dtype=np.int64)[None, :],
+    }
+    empty_kv = np.zeros((1, cfg["dec_kv_heads"], 0, cfg["dec_head_dim"]), dtype=np.float32)
+    for i in range(cfg["dec_layers"]):
+        ort_inputs[f"past_key_values.{i}.key"] = empty_kv
+        ort_inputs[f"past_key_values.{i}.value"] = empty_kv
+    return ort_inputs
+
+
+def preallocate(path, size):
+    """Create path with size bytes reserved on disk.
+
+    Without this, writing through a memmap of a freshly sized (sparse) file allocates
+    blocks page by page as they are first touched. posix_fallocate reserves them in
+    one call, as contiguously as the filesystem allows; elsewhere the file is just
+    sized with truncate().
+    """
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate") and size > 0:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size)
+
+
+def export_embeddings(sf, output_dir, int8=False, block_rows=8192):
+    """Export embedding matrix as raw float32 binary, plus the per-row INT8 copy if int8.
+
+    The checkpoint tensor is converted block_rows rows at a time straight into
+    memory-mapped output files, so no full-size float32 (or int8) copy of the table
+    is ever held in memory.
+    """
     output_path = os.path.join(output_dir, "embed_tokens.bin")
-    embed = get_weight(sf, "thinker.model.embed_tokens.weight")
-    print(f"Embedding matrix: {embed.shape} ({embed.numel() * 4 / 1024 / 1024:.1f} MB)", file=sys.stderr)
-    embed_np = embed.numpy().astype(np.float32)
-    embed_np.tofile(output_path)
+    int8_path = os.path.join(output_dir, "embed_tokens.int8.bin")
+    scales_path = os.path.join(output_dir, "embed_tokens.scales.bin")
+    # Native checkpoint dtype (bf16 for the released model); cast per block below
+    embed = sf.get_tensor("thinker.model.embed_tokens.weight")
+    assert embed.is_floating_point(), f"Unexpected embedding dtype: {embed.dtype}"
+    vocab_size, hidden_size = embed.shape
+    print(f"Embedding matrix: {tuple(embed.shape)} ({vocab_size * hidden_size * 4 / 1024 / 1024:.1f} MB)",
+          file=sys.stderr)
+
+    preallocate(output_path, vocab_size * hidden_size * 4)
+    out = np.memmap(output_path, dtype=np.float32, mode="r+", shape=(vocab_size, hidden_size))
+    if int8:
+        preallocate(int8_path, vocab_size * hidden_size)
+        q_out = np.memmap(int8_path, dtype=np.int8, mode="r+", shape=(vocab_size, hidden_size))
+        scales = torch.empty(vocab_size, dtype=torch.float16)
+        max_err = 0.0
+    for start in range(0, vocab_size, block_rows):
+        rows = embed[start:start + block_rows].float()
+        out[start:start + len(rows)] = rows.numpy()
+        if not int8:
+            continue
+
+        # Per-row symmetric INT8 copy: a lookup gathers D bytes + one fp16 scale instead of
+        # 4*D bytes. Scales are rounded to fp16 before quantizing so that int8 * scale
+        # reproduces exactly what the reader will compute.
+        row_scales = (rows.abs().amax(dim=1) / 127.0).clamp_min(torch.finfo(torch.float16).tiny).half()
+        q = (rows / row_scales.float().unsqueeze(1)).round().clamp(-128, 127).to(torch.int8)
+        q_out[start:start + len(rows)] = q.numpy()
+        scales[start:start + len(rows)] = row_scales
+        max_err = max(max_err, (q.float() * row_scales.float().unsqueeze(1) - rows).abs().max().item())
+    out.flush()
+    del out
     print(f"Embeddings exported to {output_path}", file=sys.stderr)
+    if not int8:
+        return output_path
+
+    q_out.flush()
+    del q_out
+    scales.numpy().tofile(scales_path)
+    meta = {
+        "shape": [vocab_size, hidden_size],
+        "dtype": "int8_per_row",
+        "scale_dtype": "fp16",
+        "data": os.path.basename(int8_path),
+        "scales": os.path.basename(scales_path),
+    }
+    with open(os.path.join(output_dir, "embed_tokens.meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"INT8 embeddings exported to {int8_path} (max abs error {max_err:.6e})", file=sys.stderr)
     return output_path
 
 
+# ============================================================================
+# Export stages
+# ============================================================================
+
+def encoder_stage(model_dir, cfg, output_dir, validate, external_data, mmap):
+    print("\n=== Encoder ===", file=sys.stderr)
+    sf = MultiSafetensors(model_dir, mmap=mmap)
+    with torch.device("meta"):
+        encoder = Qwen3ASREncoder(cfg)
+    load_encoder_weights(encoder, sf, cfg)
+    sf.evict()
+    # No autograd bookkeeping while tracing or computing the reference output
+    with torch.inference_mode():
+        encoder_path, reference = export_encoder(encoder, cfg, output_dir, validate=validate,
+                                                 external_data=external_data)
+    del encoder
+    gc.collect()
+    if reference is not None:
+        validate_in_subprocess(encoder_path, *reference, "Encoder")
+        del reference
+    return encoder_path
+
+
+def decoder_stage(model_dir, cfg, output_dir, validate, external_data, mmap):
+    print("\n=== Decoder ===", file=sys.stderr)
+    sf = MultiSafetensors(model_dir, mmap=mmap)
+    with torch.device("meta"):
+        decoder = Qwen3ASRDecoder(cfg)
+    load_decoder_weights(decoder, sf, cfg)
+    sf.evict()
+    with torch.inference_mode():
+        decoder_path, reference = export_decoder(decoder, cfg, output_dir, validate=validate,
+                                                 external_data=external_data)
+    del decoder
+    gc.collect()
+    if reference is not None:
+        validate_in_subprocess(decoder_path, *reference, "Decoder")
+        del reference
+    return decoder_path
+
+
+def embeddings_stage(model_dir, output_dir, int8):
+    print("\n=== Embeddings ===", file=sys.stderr)
+    # Always mapped: the table is one tensor, converted block by block, so reading its
+    # whole shard into memory would only add a full extra copy.
+    export_embeddings(MultiSafetensors(model_dir), output_dir, int8=int8)
+
+
+def variants_stage(model_path, cfg, validate, fp16, int8, optimize):
+    """Write the optional INT8 / FP16 / optimized variants of an exported model.
+
+    Runs once every required output exists. A failing variant is reported and skipped
+    so it cannot cost the others; returns the labels of the ones that failed.
+    """
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    variants = []
+    if int8 and name == "decoder":
+        variants.append(("INT8", quantize_decoder))
+    if fp16:
+        variants.append(("FP16", convert_to_fp16))
+    if optimize:
+        variants.append(("Optimized", optimize_onnx))
+
+    failed = []
+    for label, make_variant in variants:
+        print(f"\n=== {label} {name} ===", file=sys.stderr)
+        try:
+            make_variant(model_path, cfg, validate=validate)
+        except Exception as e:
+            print(f"WARNING: {label} {name} failed: {e!r}", file=sys.stderr)
+            failed.append(f"{label} {name}")
+    return failed
+
+
+def snapshot_complete(model_dir):
+    """Whether a cached snapshot has the config and every weight file the export reads."""
+    if not os.path.exists(os.path.join(model_dir, "config.json")):
+        return False
+    index_path = os.path.join(model_dir, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            shards = set(json.load(f)["weight_map"].values())
+        return all(os.path.exists(os.path.join(model_dir, shard)) for shard in shards)
+    return os.path.exists(os.path.join(model_dir, "model.safetensors"))
+
+
+def copy_tokenizer_files(model_dir, output_dir):
+    print("\n=== Tokenizer files ===", file=sys.stderr)
+    for fname in ["vocab.json", "merges.txt"]:
+        src = os.path.join(model_dir, fname)
+        dst = os.path.join(output_dir, fname)
+        if os.path.exists(src):
+            # Output dir is the model dir, or a link from a previous run: already in place
+            if os.path.exists(dst) and os.path.samefile(src, dst):
+                print(f"{fname} already in output dir", file=sys.stderr)
+                continue
+            # Never write through an existing link from a previous run into the source
+            if os.path.lexists(dst):
+                os.remove(dst)
+            try:
+                # The HF cache holds relative symlinks into blobs/. On Windows os.link
+                # links the symlink itself, which would not resolve from output_dir.
+                os.link(os.path.realpath(src), dst)
+                print(f"Linked {fname}", file=sys.stderr)
+            except (OSError, NotImplementedError):
+                # Different filesystem, or links not supported
+                shutil.copy2(src, dst)
+                print(f"Copied {fname}", file=sys.stderr)
+        else:
+            print(f"WARNING: {fname} not found in model dir", file=sys.stderr)
+
+
 # ============================================================================
 # Main
 # ============================================================================
@@ -635,62 +1194,101 @@ def main():
     parser.add_argument("--model-dir", type=str, help="Path to local model directory")
     parser.add_argument("--model-id", type=str, default="Qwen/Qwen3-ASR-0.6B",
                         help="HuggingFace model ID (downloads if --model-dir not given)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Hugging Face cache directory for --model-id "
+                             "(default: HF_HUB_CACHE / HUGGINGFACE_HUB_CACHE / HF_HOME)")
     parser.add_argument("--output-dir", type=str, required=True, help="Output directory for ONNX files")
-    parser.add_argument("--skip-validation", action="store_true", help="Skip ONNX validation")
+    parser.add_argument("--skip-validation", "--skip-validate", action="store_true",
+                        help="Skip ONNX validation")
+    parser.add_argument("--fp16", action="store_true",
+                        help="Also write encoder.fp16.onnx / decoder.fp16.onnx (FP32 I/O, FP16 weights)")
+    parser.add_argument("--int8", action="store_true",
+                        help="Also write decoder.int8.onnx (dynamic INT8 MatMul weights) and the "
+                             "per-row INT8 embedding table")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Also write encoder.opt.onnx / decoder.opt.onnx with ORT transformer "
+                             "fusions applied offline")
+    parser.add_argument("--external-data", action="store_true",
+                        help="Store encoder.onnx / decoder.onnx weights in a single .onnx_data file "
+                             "next to each model (always done for models over 2 GB)")
+    parser.add_argument("--no-mmap", action="store_true",
+                        help="Read safetensors shards into memory with bulk reads instead of "
+                             "memory-mapping them (faster cold loads on Windows, more RAM; "
+                             "the embedding table is always mapped)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Run the encoder, decoder and embedding stages in up to this many "
+                             "processes (peak RAM grows with each concurrent stage)")
     args = parser.parse_args()
 
+    # Must be set before CUDA initializes; inherited by stage worker processes
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512")
+
     # Resolve model directory
     if args.model_dir:
         model_dir = args.model_dir
     else:
+        # hf_transfer parallelizes ranged downloads; huggingface_hub only uses it when
+        # this is set before import, and errors if it is set but not installed.
+        if importlib.util.find_spec("hf_transfer") is not None:
+            os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
         from huggingface_hub import snapshot_download
-        print(f"Downloading {args.model_id}...", file=sys.stderr)
-        model_dir = snapshot_download(args.model_id)
+        from huggingface_hub.utils import LocalEntryNotFoundError
+        # Only what this script reads: weights, config and the tokenizer files it copies
+        allow_patterns = ["*.safetensors", "*.safetensors.index.json", "config.json",
+                          "vocab.json", "merges.txt", "tokenizer*.json"]
+        try:
+            # A warm cache resolves without touching the Hub API
+            model_dir = snapshot_download(args.model_id, cache_dir=args.cache_dir,
+                                          allow_patterns=allow_patterns, local_files_only=True)
+        except LocalEntryNotFoundError:
+            model_dir = None
+        # An interrupted download leaves a snapshot missing files; the networked call resumes it
+        if model_dir and snapshot_complete(model_dir):
+            print(f"Using cached {args.model_id}", file=sys.stderr)
+        else:
+            print(f"Downloading {args.model_id}...", file=sys.stderr)
+            model_dir = snapshot_download(args.model_id, cache_dir=args.cache_dir,
+                                          allow_patterns=allow_patterns, max_workers=8)
 
     os.makedirs(args.output_dir, exist_ok=True)
 
-    # Load config and weights
     cfg = load_config(model_dir)
     print(f"Config: enc_d={cfg['enc_d_model']}, enc_layers={cfg['enc_layers']}, "
           f"dec_hidden={cfg['dec_hidden_size']}, dec_layers={cfg['dec_layers']}", file=sys.stderr)
 
-    sf = MultiSafetensors(model_dir)
-
-    # Build and export encoder
-    print("\n=== Encoder ===", file=sys.stderr)
-    encoder = Qwen3ASREncoder(cfg)
-    load_encoder_weights(encoder, sf, cfg)
-    export_encoder(encoder, cfg, args.output_dir)
-    del encoder
-    torch.cuda.empty_cache() if torch.cuda.is_available() else None
-
-    # Build and export decoder
-    print("\n=== Decoder ===", file=sys.stderr)
-    decoder = Qwen3ASRDecoder(cfg)
-    load_decoder_weights(decoder, sf, cfg)
-    export_decoder(decoder, cfg, args.output_dir)
-    del decoder
-    torch.cuda.empty_cache() if torch.cuda.is_available() else None
-
-    # Export embeddings
-    print("\n=== Embeddings ===", file=sys.stderr)
-    export_embeddings(sf, args.output_dir)
-
-    # Copy tokenizer files
-    print("\n=== Tokenizer files ===", file=sys.stderr)
-    for fname in ["vocab.json", "merges.txt"]:
-        src = os.path.join(model_dir, fname)
-        dst = os.path.join(args.output_dir, fname)
-        if os.path.exists(src):
-            shutil.copy2(src, dst)
-            print(f"Copied {fname}", file=sys.stderr)
-        else:
-            print(f"WARNING: {fname} not found in model dir", file=sys.stderr)
+    validate = not args.skip_validation
+    mmap = not args.no_mmap
+    stages = [
+        (encoder_stage, (model_dir, cfg, args.output_dir, validate, args.external_data, mmap)),
+        (decoder_stage, (model_dir, cfg, args.output_dir, validate, args.external_data, mmap)),
+        (embeddings_stage, (model_dir, args.output_dir, args.int8)),
+    ]
+    variant_flags = (validate, args.fp16, args.int8, args.optimize)
+    if args.jobs > 1:
+        # Stages read disjoint weights and write disjoint files. Each worker opens its
+        # own mmap of the shards, so the page cache is shared between them.
+        threads = max(1, (os.cpu_count() or 1) // args.jobs)
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(stages)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=torch.set_num_threads, initargs=(threads,)) as pool:
+            futures = [pool.submit(stage, *stage_args) for stage, stage_args in stages]
+            encoder_path, decoder_path, _ = [future.result() for future in futures]
+            copy_tokenizer_files(model_dir, args.output_dir)
+            futures = [pool.submit(variants_stage, path, cfg, *variant_flags)
+                       for path in (encoder_path, decoder_path)]
+            failed = [label for future in futures for label in future.result()]
+    else:
+        encoder_path, decoder_path, _ = [stage(*stage_args) for stage, stage_args in stages]
+        copy_tokenizer_files(model_dir, args.output_dir)
+        failed = [label for path in (encoder_path, decoder_path)
+                  for label in variants_stage(path, cfg, *variant_flags)]
 
     print(f"\nExport complete. Files in {args.output_dir}:", file=sys.stderr)
-    for f in sorted(os.listdir(args.output_dir)):
-        size = os.path.getsize(os.path.join(args.output_dir, f))
-        print(f"  {f}: {size / 1024 / 1024:.1f} MB", file=sys.stderr)
+    with os.scandir(args.output_dir) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            print(f"  {entry.name}: {entry.stat().st_size / 1024 / 1024:.1f} MB", file=sys.stderr)
+    if failed:
+        sys.exit(f"Optional variants failed: {', '.join(failed)}")
 
 
 if __name__ == "__main__":